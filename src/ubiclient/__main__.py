@@ -1,3 +1,119 @@
-# import ubiapi.schemas
-# import ubiapi.checkout
+"""
+Bulk export of checkouts.
 
+    python -m ubiclient --since 2022-06-01 --until 2022-07-01 --workers 4 --format csv --output checkouts.csv --checkpoint export.ckpt
+
+If the checkpoint file exists, the export resumes from it: the output is truncated to what the
+checkpoint covers and appended to. The range and workers saved in the checkpoint take precedence
+over the arguments.
+The checkpoint is removed once the export completes.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+from dateutil import parser
+import requests
+
+from .export import FORMATS, Checkpoint, CsvWriter, ExportException, Exporter, NdjsonWriter, ParquetWriter
+
+
+def parse_datetime(s: str) -> datetime:
+    # same convention as the schemas: naive datetimes in UTC
+    dt = parser.parse(s)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="python -m ubiclient", description="Export checkouts of the current account.")
+    arg_parser.add_argument("--since", type=parse_datetime, required=True, help="export checkouts updated at or after this time")
+    arg_parser.add_argument("--until", type=parse_datetime, default=None, help="export checkouts updated before this time (default: now)")
+    arg_parser.add_argument("-w", "--workers", type=int, default=4, help="number of parallel workers (default: 4)")
+    arg_parser.add_argument("-f", "--format", choices=FORMATS, default="ndjson", help="output format (default: ndjson)")
+    arg_parser.add_argument("-o", "--output", default=None, help="output file (default: stdout)")
+    arg_parser.add_argument("--checkpoint", default=None, help="checkpoint file to save progress to and resume from")
+    args = arg_parser.parse_args(argv)
+
+    if args.workers < 1:
+        arg_parser.error("--workers must be at least 1")
+    if args.format == "parquet" and args.output is None:
+        arg_parser.error("--output is required for parquet")
+    if args.format == "parquet" and args.checkpoint is not None:
+        arg_parser.error("--checkpoint is not supported for parquet, which cannot be resumed")
+    return args
+
+
+def load_checkpoint(args) -> tuple:
+    if args.checkpoint is not None and os.path.exists(args.checkpoint):
+        checkpoint = Checkpoint.load(args.checkpoint)
+        if checkpoint.format != args.format:
+            raise ExportException("checkpoint was written for format {}".format(checkpoint.format))
+        since, until, workers = checkpoint.windows[0].since, checkpoint.windows[-1].until, len(checkpoint.windows)
+        if since != args.since or (args.until is not None and until != args.until) or workers != args.workers:
+            print("using the checkpoint's range {} - {} with {} workers instead of the given arguments".format(
+                since.isoformat(), until.isoformat(), workers), file=sys.stderr)
+        return checkpoint, True
+
+    until = args.until if args.until is not None else datetime.utcnow().replace(microsecond=0)
+    return Checkpoint.create(args.format, args.since, until, args.workers), False
+
+
+def open_writer(args, checkpoint: Checkpoint, resume: bool):
+    if args.format == "parquet":
+        return ParquetWriter(args.output), None
+
+    if args.output is None:
+        stream, owned = sys.stdout, None
+    else:
+        if resume and checkpoint.output_offset is not None:
+            # drop rows written after the last checkpoint, they are exported again
+            os.truncate(args.output, checkpoint.output_offset)
+        stream = open(args.output, "a" if resume else "w", encoding="utf-8", newline="")
+        owned = stream
+
+    if args.format == "csv":
+        write_header = not resume or (args.output is not None and os.path.getsize(args.output) == 0)
+        return CsvWriter(stream, write_header), owned
+    return NdjsonWriter(stream), owned
+
+
+def print_resume_hint(args, message: str) -> None:
+    if args.checkpoint is not None:
+        message += ", rerun with --checkpoint {} to resume".format(args.checkpoint)
+    print(message, file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        checkpoint, resume = load_checkpoint(args)
+        if resume:
+            print("resuming from {} ({} checkouts already exported)".format(args.checkpoint, checkpoint.records), file=sys.stderr)
+
+        writer, owned = open_writer(args, checkpoint, resume)
+        try:
+            stats = Exporter(checkpoint, writer, args.checkpoint).run()
+        finally:
+            writer.close()
+            if owned is not None:
+                owned.close()
+    except ExportException as e:
+        print("error: {}".format(e), file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print_resume_hint(args, "interrupted")
+        return 130
+    except requests.RequestException as e:
+        print_resume_hint(args, "error: {}".format(e))
+        return 1
+
+    if args.checkpoint is not None and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    print(stats.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from dateutil import parser
+from typing import Dict, Iterable, List, Optional, Union
+
+from .utilities.utils import get_logger
+from .schemas import Account, Cashier, Checkout, CustomerTag, EnrichedCheckout, PaymentType, PriceBook
+from .ubi_agent import SimpleReponse
+
+logger = get_logger(__name__)
+
+
+def to_date(d: Union[str, date, datetime]) -> date:
+    # accepts "2019/10/01" (price books), "2011-12-25" (sales_date) or date objects
+    if isinstance(d, datetime):
+        return d.date()
+    if isinstance(d, date):
+        return d
+    return parser.parse(d).date()
+
+
+class PriceBookIntervals:
+    """
+    Interval index over PriceBook.valid_since / valid_until (both inclusive).
+
+    The timeline is cut at every interval boundary and each elementary segment
+    keeps the price books active in it, so a lookup is a single bisect.
+    """
+    def __init__(self, price_books: Iterable[PriceBook]) -> None:
+        intervals = []
+        for p in price_books:
+            since = to_date(p.valid_since)
+            # store the exclusive end so that segments are half-open [start, end)
+            end = to_date(p.valid_until) + timedelta(days=1) if p.valid_until else None
+            intervals.append((since, end, p))
+
+        self._boundaries: List[date] = sorted({b for since, end, _ in intervals for b in (since, end) if b is not None})
+        self._segments: List[List[PriceBook]] = [
+            [p for since, end, p in intervals if since <= start and (end is None or start < end)]
+            for start in self._boundaries
+        ]
+
+    def at(self, d: Union[str, date, datetime]) -> List[PriceBook]:
+        i = bisect_right(self._boundaries, to_date(d)) - 1
+        if i < 0:
+            return []
+        return self._segments[i]
+
+
+class AccountIndex:
+    """
+    Id -> entity lookup tables built from an Account.
+    Use refresh() with a newer Account to update the tables in place.
+    """
+    def __init__(self, account: Account) -> None:
+        self.updated_at: Optional[datetime] = None
+        self.cashiers: Dict[int, Cashier] = dict()
+        self.payment_types: Dict[int, PaymentType] = dict()
+        self.customer_tags: Dict[int, CustomerTag] = dict()
+        self.price_books: Dict[int, PriceBook] = dict()
+        self._price_book_intervals = PriceBookIntervals([])
+        self.refresh(account)
+
+    @staticmethod
+    def from_response(resp: SimpleReponse) -> "AccountIndex":
+        if resp.account is None:
+            raise ValueError("response has no account")
+        return AccountIndex(resp.account)
+
+    def refresh(self, account: Account) -> bool:
+        """
+        Updates the tables from an account
+        Args:
+            account (Account): Account, typically re-fetched from accounts/current
+
+        Returns:
+            bool: False if the account has not changed since the last refresh
+        """
+        if self.updated_at is not None and account.updated_at == self.updated_at:
+            return False
+
+        self._sync(self.cashiers, account.cashiers)
+        self._sync(self.payment_types, account.payment_types)
+        self._sync(self.customer_tags, account.customer_tags)
+        if self._sync(self.price_books, account.price_books):
+            self._price_book_intervals = PriceBookIntervals(self.price_books.values())
+
+        logger.info("AccountIndex.refresh: account {} updated_at {}".format(account.id, account.updated_at))
+        self.updated_at = account.updated_at
+        return True
+
+    @staticmethod
+    def _sync(table: dict, entities: list) -> bool:
+        # upserts changed entities and drops removed ones; returns whether the table changed
+        changed = False
+        ids = set()
+        for e in entities:
+            ids.add(e.id)
+            if table.get(e.id) != e:
+                table[e.id] = e
+                changed = True
+        for id in [id for id in table if id not in ids]:
+            del table[id]
+            changed = True
+        return changed
+
+    def cashier(self, id: Optional[int]) -> Optional[Cashier]:
+        return self.cashiers.get(id)
+
+    def payment_type(self, id: Optional[int]) -> Optional[PaymentType]:
+        return self.payment_types.get(id)
+
+    def customer_tag(self, id: Optional[int]) -> Optional[CustomerTag]:
+        return self.customer_tags.get(id)
+
+    def price_books_at(self, d: Union[str, date, datetime]) -> List[PriceBook]:
+        return self._price_book_intervals.at(d)
+
+    def enrich(self, checkouts: Iterable[Checkout]) -> List[EnrichedCheckout]:
+        """
+        Joins checkouts with the cashiers, payment types, customer tags and price books they refer to
+        Args:
+            checkouts (Iterable[Checkout]): Checkouts, e.g. a page of CollectionReponse.checkouts
+
+        Returns:
+            List[EnrichedCheckout]: Enriched checkouts in the same order
+        """
+        # most checkouts in a page share a handful of sales dates
+        price_books_by_date: Dict[str, List[PriceBook]] = dict()
+
+        enriched = []
+        for c in checkouts:
+            price_books = price_books_by_date.get(c.sales_date)
+            if price_books is None:
+                price_books = price_books_by_date[c.sales_date] = self.price_books_at(c.sales_date)
+
+            enriched.append(EnrichedCheckout(
+                checkout=c,
+                cashier=self.cashiers.get(c.cashier_id),
+                payment_types=[self.payment_types.get(p.payment_type_id) for p in c.payments],
+                customer_tags=[self.customer_tags[id] for id in c.customer_tag_ids if id in self.customer_tags],
+                price_books=price_books))
+        return enriched
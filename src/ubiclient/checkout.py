@@ -1,11 +1,11 @@
 from abc import ABC, abstractmethod
 from typing_extensions import Self
 from venv import create
-from typing import Optional, List
+from typing import Iterator, Optional, List
 
 from .utilities.utils import get_logger
 from .schemas import Checkout, Account, CheckoutCreate, CheckoutPartialUpdate
-from .ubi_agent import SearchCriteria, Checkout, UbiAgent
+from .ubi_agent import CollectionReponse, SearchCriteria, Checkout, UbiAgent
 
 logger = get_logger(__name__)
 
@@ -80,22 +80,39 @@ class CheckoutManager(CheckoutManagerBase):
 
 
     def search(self, criteria : Optional[SearchCriteria] = None) -> Optional[List[Checkout]]:
+        checkouts = []
+        for resp in self.iter_pages(criteria):
+            checkouts += resp.checkouts
+        return checkouts
+
+
+    def iter_pages(self, criteria : Optional[SearchCriteria] = None, uri : Optional[str] = None) -> Iterator[CollectionReponse]:
+        """
+        Yields result sets one page at a time instead of loading them all
+        Args:
+            criteria (SearchCriteria): Search criteria
+            uri (str): Resource uri to start from, e.g. a next-url saved from an earlier page
+
+        Returns:
+            Iterator[CollectionReponse]: Result sets, the last one has no next-url
+        """
         if criteria is None:
             criteria = SearchCriteria.get_default()
 
-        uri = "accounts/current/checkouts/"
+        if uri is None:
+            uri = "accounts/current/checkouts/"
 
-        checkouts = []
         while True:
-            # keep getting and concatinating result sets until a response has next-url
+            # keep getting result sets until a response has no next-url
             resp = self.client.search(uri, criteria)
-            checkouts += resp.checkouts
+            if resp.checkouts is None:
+                # the response may be shared with other callers, see UbiAgent
+                resp = resp.copy(update={"checkouts": []})
+            yield resp
             if resp.next_url is None:
                 break
             uri = resp.next_url
 
-        return checkouts
-
 
     def get(self, id: int) -> Optional[Checkout]:
         resp = self.client.get(id)
@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, TextIO
+from pydantic import BaseModel
+
+from .utilities.utils import get_logger
+from .schemas import Checkout
+from .checkout import CheckoutManager
+from .ubi_agent import SearchCriteria
+
+logger = get_logger(__name__)
+
+FORMATS = ["ndjson", "csv", "parquet"]
+
+
+class ExportException(Exception):
+    ...
+
+
+class ExportWindow(BaseModel):
+    """
+    A slice of [since, until) exported by one worker
+    """
+    since: datetime
+    until: datetime
+    next_uri: Optional[str]  # next-url to resume from, None to start over
+    done: bool = False
+
+
+class Checkpoint(BaseModel):
+    """
+    Export progress, saved after every page written
+    """
+    format: str
+    windows: List[ExportWindow]
+    records: int = 0
+    output_offset: Optional[int]  # output size in bytes when saved, None if the output is not a file
+
+    @staticmethod
+    def create(format: str, since: datetime, until: datetime, workers: int) -> "Checkpoint":
+        if since >= until:
+            raise ExportException("since must be earlier than until")
+        step = (until - since) / workers
+        bounds = [since + step * i for i in range(workers)] + [until]
+        windows = [ExportWindow(since=s, until=u) for s, u in zip(bounds, bounds[1:]) if s < u]
+        return Checkpoint(format=format, windows=windows)
+
+    @staticmethod
+    def load(path: str) -> "Checkpoint":
+        return Checkpoint.parse_file(path)
+
+    def save(self, path: str) -> None:
+        # write then rename so that an interruption never leaves a truncated checkpoint
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.json())
+        os.replace(tmp_path, path)
+
+
+def flatten(checkout: Checkout) -> dict:
+    # nested values are kept as JSON text so that every format shares one flat column set
+    row = checkout.dict()
+    for key, value in row.items():
+        if isinstance(value, (list, dict)):
+            row[key] = json.dumps(value, default=str, ensure_ascii=False)
+    return row
+
+
+def stream_offset(stream: TextIO) -> Optional[int]:
+    # after a flush, tell() of a file opened with "w" or "a" is its size in bytes
+    try:
+        return stream.tell() if stream.seekable() else None
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class NdjsonWriter:
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def write(self, checkouts: List[Checkout]) -> None:
+        self.stream.writelines(c.json(ensure_ascii=False) + "\n" for c in checkouts)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def offset(self) -> Optional[int]:
+        return stream_offset(self.stream)
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class CsvWriter:
+    def __init__(self, stream: TextIO, write_header: bool = True) -> None:
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=list(Checkout.__fields__))
+        if write_header:
+            self.writer.writeheader()
+
+    def write(self, checkouts: List[Checkout]) -> None:
+        rows = [flatten(c) for c in checkouts]
+        for row in rows:
+            for key, value in row.items():
+                if isinstance(value, datetime):
+                    row[key] = value.isoformat()
+        self.writer.writerows(rows)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def offset(self) -> Optional[int]:
+        return stream_offset(self.stream)
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class ParquetWriter:
+    def __init__(self, path: str) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportException("parquet export requires pyarrow: pip install ubiclient[parquet]")
+
+        self.pa = pyarrow
+        types = {int: pyarrow.int64(), datetime: pyarrow.timestamp("us")}
+        self.schema = pyarrow.schema([(name, types.get(f.outer_type_, pyarrow.string())) for name, f in Checkout.__fields__.items()])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, checkouts: List[Checkout]) -> None:
+        # one row group per page
+        if len(checkouts) > 0:
+            self.writer.write_table(self.pa.Table.from_pylist([flatten(c) for c in checkouts], schema=self.schema))
+
+    def flush(self) -> None:
+        # row groups are only readable once the footer is written on close, hence no resume
+        ...
+
+    def offset(self) -> Optional[int]:
+        return None
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class ExportStats:
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.records = 0
+        self.pages = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def summary(self) -> str:
+        elapsed = self.elapsed()
+        rate = self.records / elapsed if elapsed > 0 else 0.0
+        return "exported {} checkouts in {} pages, {:.1f}s, {:.1f} checkouts/s".format(self.records, self.pages, elapsed, rate)
+
+
+class Exporter:
+    """
+    Exports checkouts with several workers, each paging through its own time window.
+    Pages are written as soon as they arrive, and the checkpoint is saved after each one.
+    """
+    def __init__(self, checkpoint: Checkpoint, writer, checkpoint_path: Optional[str] = None,
+                 manager_factory: Callable[[], CheckoutManager] = CheckoutManager) -> None:
+        self.checkpoint = checkpoint
+        self.writer = writer
+        self.checkpoint_path = checkpoint_path
+        self.manager_factory = manager_factory
+        self.stats = ExportStats()
+        self.threads: List[threading.Thread] = []
+
+    def run(self) -> ExportStats:
+        windows = [(i, w) for i, w in enumerate(self.checkpoint.windows) if not w.done]
+        # bounded so that fast workers cannot pile up pages in memory
+        pages = queue.Queue(maxsize=2 * max(len(windows), 1))
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            # never block for good on a full queue once the export has stopped
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def work(i: int, window: ExportWindow):
+            try:
+                manager = self.manager_factory()
+                criteria = SearchCriteria(since=window.since, until=window.until)
+                for resp in manager.iter_pages(criteria, window.next_uri):
+                    if not put((i, resp)):
+                        return
+            except Exception as e:
+                put((i, e))
+
+        self.threads = [threading.Thread(target=work, args=(i, window), daemon=True) for i, window in windows]
+        for t in self.threads:
+            t.start()
+
+        pending = len(windows)
+        try:
+            while pending > 0:
+                i, resp = pages.get()
+                if isinstance(resp, Exception):
+                    raise resp
+
+                self.writer.write(resp.checkouts)
+                self.stats.records += len(resp.checkouts)
+                self.stats.pages += 1
+
+                window = self.checkpoint.windows[i]
+                window.next_uri = resp.next_url
+                if resp.next_url is None:
+                    window.done = True
+                    pending -= 1
+                self.checkpoint.records += len(resp.checkouts)
+                self.save_checkpoint()
+        finally:
+            stop.set()
+
+        return self.stats
+
+    def save_checkpoint(self) -> None:
+        if self.checkpoint_path is None:
+            return
+        # rows written after this offset are not covered by the checkpoint and get truncated on resume
+        self.writer.flush()
+        self.checkpoint.output_offset = self.writer.offset()
+        self.checkpoint.save(self.checkpoint_path)
@@ -25,7 +25,10 @@ class CalculationOption(BaseModel):
 
 
 class CheckoutPayment(BaseModel):
-    ...
+    id: Optional[int]  # 271086000,
+    guid: Optional[str]  # "372c8442-72af-4f5c-be56-f5b5df873e40",
+    payment_type_id: Optional[int]  # 207227,
+    amount: Optional[str]  # "42000.0",
 
 
 class CheckoutItem(BaseModel):
@@ -220,3 +223,14 @@ class Account(BaseModel):
     @validator("expire_at", "created_at", "updated_at", pre=True)
     def my_date_validator(cls, d):
         return date_validator(cls, d)
+
+
+class EnrichedCheckout(BaseModel):
+    """
+    Checkout joined with the account entities it refers to
+    """
+    checkout: Checkout
+    cashier: Optional[Cashier]
+    payment_types: List[Optional[PaymentType]]  # one per checkout.payments, None if unknown
+    customer_tags: List[CustomerTag]
+    price_books: List[PriceBook]  # price books valid on checkout.sales_date
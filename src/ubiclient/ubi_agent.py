@@ -6,6 +6,8 @@ from datetime import datetime
 from dateutil import parser
 import requests
 import os
+import copy
+import threading
 from .utilities.utils import get_logger
 
 logger = get_logger(__name__)
@@ -88,13 +90,85 @@ class UbiAgentBase(ABC):
 class UbiAgentException(Exception):
     ...
 
-class UbiAgent(UbiAgentBase):
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time; callers arriving while it is in flight wait and share its result.
+    """
     def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls = dict()
+        self.calls = 0  # total calls to do()
+        self.coalesced = 0  # calls served by another caller's in-flight call
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                # a copy per follower, so that threads do not append to one shared traceback
+                raise self._copy_error(call.error) from call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException as e:
+            # KeyboardInterrupt, SystemExit... belong to the leader's thread only, followers just fail
+            call.error = UbiAgentException("in-flight call was interrupted: {!r}".format(e))
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    @staticmethod
+    def _copy_error(error: BaseException) -> BaseException:
+        # copy keeps args and attributes such as HTTPError.response, but not the traceback
+        try:
+            return copy.copy(error)
+        except Exception:
+            return UbiAgentException("coalesced call failed: {!r}".format(error))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class UbiAgent(UbiAgentBase):
+    """
+    Thread-safe: one agent can be shared across threads.
+    Concurrent identical get/search calls are coalesced into one HTTP request and
+    share the same parsed response, which callers must therefore not modify.
+    """
+    def __init__(self, coalesce: bool = True) -> None:
         super().__init__()
         self.base_uri = "https://ubiregi.com/api/3/"
         self.auth_token = os.environ["X-Ubiregi-Auth-Token"]
+        self.coalesce = coalesce
+        self.single_flight = SingleFlight()
 
     def build_uri(self, resource_uri):
+        # next-url in a collection response is already absolute
+        if resource_uri.startswith("http://") or resource_uri.startswith("https://"):
+            return resource_uri
         return self.base_uri + resource_uri
 
     def http_get(self, resource_uri, headers: dict = None, query_strings : dict = None) -> requests.Response:
@@ -117,15 +191,33 @@ class UbiAgent(UbiAgentBase):
         ...
 
     def search(self, resource_uri, criteria : SearchCriteria = None) -> CollectionReponse:
-        response = self.http_get(resource_uri, query_strings=criteria.to_query_string() if criteria is not None else None)
-        response.raise_for_status()
-        return CollectionReponse.parse_obj(response.json())
+        query_strings = criteria.to_query_string() if criteria is not None else None
+
+        def fetch():
+            response = self.http_get(resource_uri, query_strings=query_strings)
+            response.raise_for_status()
+            return CollectionReponse.parse_obj(response.json())
+
+        return self.coalesced("search", resource_uri, query_strings, fetch)
 
 
     def get(self, resource_uri) -> SimpleReponse:
-        response = self.http_get(resource_uri)
-        response.raise_for_status()
-        return SimpleReponse.parse_obj(response.json())
+        def fetch():
+            response = self.http_get(resource_uri)
+            response.raise_for_status()
+            return SimpleReponse.parse_obj(response.json())
+
+        return self.coalesced("get", resource_uri, None, fetch)
+
+
+    def coalesced(self, method, resource_uri, query_strings : dict, fetch):
+        if not self.coalesce:
+            return fetch()
+        key = (method, self.build_uri(str(resource_uri)), tuple(sorted(query_strings.items())) if query_strings else ())
+        return self.single_flight.do(key, fetch)
+
+    def coalescing_stats(self) -> dict:
+        return self.single_flight.stats()
 
 
     def update(self, resource_uri, resource) -> None:
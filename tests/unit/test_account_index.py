@@ -0,0 +1,63 @@
+from datetime import datetime
+import unittest
+from os.path import dirname as d
+from os.path import abspath, join
+from ubiclient.account import AccountIndex
+from ubiclient.ubi_agent import SimpleReponse, CollectionReponse
+import json
+
+class TestAccountIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.resp_account = SimpleReponse.parse_obj(self.load_json("resp_account.json"))
+        self.checkouts = CollectionReponse.parse_obj(self.load_json("resp_checkouts.json")).checkouts
+
+    def load_json(self, file_name):
+        with open(join(d(abspath(__file__)), file_name), 'r', encoding="utf-8") as json_file:
+            return json.load(json_file)
+
+    def test_lookup(self):
+        sut = AccountIndex.from_response(self.resp_account)
+
+        self.assertEqual("レジ1", sut.cashier(167226).name)
+        self.assertEqual("cash", sut.payment_type(207227).kind)
+        self.assertEqual("Dating", sut.customer_tag(10).name)
+        self.assertIsNone(sut.cashier(None))
+        self.assertIsNone(sut.payment_type(0))
+
+    def test_price_books_at(self):
+        sut = AccountIndex(self.resp_account.account)
+
+        self.assertEqual([], sut.price_books_at("2019-09-30"))
+        self.assertEqual([123], [p.id for p in sut.price_books_at("2019-10-01")])
+        self.assertEqual([123, 124], [p.id for p in sut.price_books_at("2022-06-24")])
+        self.assertEqual([124], [p.id for p in sut.price_books_at(datetime(2022, 6, 25))])
+        self.assertEqual([124], [p.id for p in sut.price_books_at("2030-01-01")])
+
+    def test_enrich(self):
+        sut = AccountIndex(self.resp_account.account)
+
+        enriched = sut.enrich(self.checkouts)
+
+        self.assertEqual(len(self.checkouts), len(enriched))
+        by_id = {e.checkout.id: e for e in enriched}
+        self.assertEqual("レジ1", by_id[285646173].cashier.name)
+        self.assertIsNone(by_id[285637643].cashier)
+        self.assertEqual([], by_id[285637643].payment_types)
+        self.assertEqual(["cash"], [p.kind for p in by_id[285659955].payment_types])
+        self.assertEqual(["credit"], [p.kind for p in by_id[285661174].payment_types])
+        self.assertEqual([124], [p.id for p in by_id[285661174].price_books])
+
+    def test_refresh(self):
+        sut = AccountIndex(self.resp_account.account)
+        account = self.resp_account.account.copy(deep=True)
+
+        account.cashiers[0].name = "レジ2"
+        self.assertFalse(sut.refresh(account))
+        self.assertEqual("レジ1", sut.cashier(167226).name)
+
+        account.updated_at = datetime(2022, 6, 12)
+        account.price_books = account.price_books[1:]
+        self.assertTrue(sut.refresh(account))
+        self.assertEqual("レジ2", sut.cashier(167226).name)
+        self.assertEqual([124], [p.id for p in sut.price_books_at("2022-06-24")])
+        self.assertNotIn(123, sut.price_books)
@@ -0,0 +1,266 @@
+from datetime import datetime
+import io
+import csv
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from os.path import dirname as d
+from os.path import abspath, join
+import requests
+from ubiclient.__main__ import main, parse_datetime
+from ubiclient.export import Checkpoint, CsvWriter, Exporter, NdjsonWriter, ParquetWriter
+from ubiclient.ubi_agent import CollectionReponse, SearchCriteria, UbiClientForTest
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def load_resp_checkouts():
+    with open(join(d(abspath(__file__)), "resp_checkouts.json"), 'r') as json_file:
+        return json.load(json_file)
+
+
+class FailingClient(UbiClientForTest):
+    def __init__(self, resp_checkouts: dict, fail_at: int) -> None:
+        super().__init__(resp_checkouts)
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def search(self, resource_uri, criteria):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise ConnectionError("connection reset")
+        return super().search(resource_uri, criteria)
+
+
+class RangeClient(UbiClientForTest):
+    """
+    Honours until as well as since, so that each worker only sees its own window
+    """
+    def search(self, resource_uri, criteria: SearchCriteria):
+        until = criteria.until
+        resp = super().search(resource_uri, SearchCriteria(since=criteria.since))
+        resp.checkouts = [c for c in resp.checkouts if c.updated_at < until]
+        return resp
+
+
+class NextUrlClient(UbiClientForTest):
+    """
+    Pages by next-url like the API does, so that a fresh client can resume from a saved next-url
+    """
+    def search(self, resource_uri, criteria: SearchCriteria):
+        pos = int(resource_uri.split("pos=")[1]) if "pos=" in resource_uri else 0
+        copy = self._resp_checkouts.copy()
+        copy["checkouts"] = self._resp_checkouts["checkouts"][pos : pos+self.window]
+        pos += self.window
+        copy["next-url"] = "http://nexturi.com/?pos={}".format(pos) if pos < len(self._resp_checkouts["checkouts"]) else None
+        return CollectionReponse.parse_obj(copy)
+
+
+class InterruptingWriter(NdjsonWriter):
+    """
+    Writes part of the second page and is then interrupted
+    """
+    def write(self, checkouts) -> None:
+        InterruptingWriter.pages += 1
+        if InterruptingWriter.pages == 2:
+            super().write(checkouts[:5])
+            raise KeyboardInterrupt()
+        super().write(checkouts)
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = UbiClientForTest(self.get_resp_checkouts())
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = join(self.tmp_dir.name, "export.ckpt")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def get_resp_checkouts(self):
+        return load_resp_checkouts()
+
+    def create_checkpoint(self, format="ndjson", workers=1):
+        return Checkpoint.create(format, datetime(1900, 1, 1), datetime(2100, 1, 1), workers)
+
+    def test_create_checkpoint(self):
+        checkpoint = self.create_checkpoint(workers=4)
+        self.assertEqual(4, len(checkpoint.windows))
+        self.assertEqual(datetime(1900, 1, 1), checkpoint.windows[0].since)
+        self.assertEqual(datetime(2100, 1, 1), checkpoint.windows[-1].until)
+        for w, next_w in zip(checkpoint.windows, checkpoint.windows[1:]):
+            self.assertEqual(w.until, next_w.since)
+
+    def test_export_ndjson(self):
+        with patch("ubiclient.checkout.create_client", return_value = self.client):
+            self.client.window = 5
+            out = io.StringIO()
+            stats = Exporter(self.create_checkpoint(), NdjsonWriter(out)).run()
+
+            lines = out.getvalue().splitlines()
+            self.assertEqual(26, len(lines))
+            self.assertEqual(26, stats.records)
+            self.assertEqual(6, stats.pages)
+            self.assertEqual(285637643, json.loads(lines[0])["id"])
+
+    def test_export_csv(self):
+        with patch("ubiclient.checkout.create_client", return_value = self.client):
+            out = io.StringIO()
+            Exporter(self.create_checkpoint("csv"), CsvWriter(out)).run()
+
+            rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+            self.assertEqual(26, len(rows))
+            self.assertEqual("285637643", rows[0]["id"])
+            self.assertEqual("2022-06-25T11:41:52", rows[0]["updated_at"])
+
+    def test_resume(self):
+        client = FailingClient(self.get_resp_checkouts(), fail_at=3)
+        client.window = 10
+        out = io.StringIO()
+        with patch("ubiclient.checkout.create_client", return_value = client):
+            with self.assertRaises(ConnectionError):
+                Exporter(self.create_checkpoint(), NdjsonWriter(out), self.checkpoint_path).run()
+
+            checkpoint = Checkpoint.load(self.checkpoint_path)
+            self.assertEqual(20, checkpoint.records)
+            self.assertFalse(checkpoint.windows[0].done)
+            self.assertIsNotNone(checkpoint.windows[0].next_uri)
+
+            Exporter(checkpoint, NdjsonWriter(out), self.checkpoint_path).run()
+
+        ids = [json.loads(line)["id"] for line in out.getvalue().splitlines()]
+        self.assertEqual(26, len(ids))
+        self.assertEqual(26, len(set(ids)))
+        self.assertTrue(Checkpoint.load(self.checkpoint_path).windows[0].done)
+
+    def test_export_parallel(self):
+        def create_client():
+            client = RangeClient(self.get_resp_checkouts())
+            client.window = 2
+            return client
+
+        # one hour per worker: 20, 3, 0 and 3 checkouts
+        checkpoint = Checkpoint.create("ndjson", datetime(2022, 6, 25, 11), datetime(2022, 6, 25, 15), 4)
+        out = io.StringIO()
+        with patch("ubiclient.checkout.create_client", side_effect=create_client) as mocked_factory:
+            sut = Exporter(checkpoint, NdjsonWriter(out), self.checkpoint_path)
+            stats = sut.run()
+            self.assertEqual(4, mocked_factory.call_count)
+
+        ids = [json.loads(line)["id"] for line in out.getvalue().splitlines()]
+        self.assertEqual(26, stats.records)
+        self.assertEqual(26, len(ids))
+        self.assertEqual({c["id"] for c in self.get_resp_checkouts()["checkouts"]}, set(ids))
+        self.assertTrue(all(w.done for w in Checkpoint.load(self.checkpoint_path).windows))
+
+    def test_export_parallel_failure(self):
+        def create_client():
+            # the first worker fails on its second page, the others keep filling the queue
+            fail_at = 2 if create_client.count == 0 else 0
+            create_client.count += 1
+            client = FailingClient(self.get_resp_checkouts(), fail_at=fail_at)
+            client.window = 1
+            return client
+        create_client.count = 0
+
+        with patch("ubiclient.checkout.create_client", side_effect=create_client):
+            sut = Exporter(self.create_checkpoint(workers=4), NdjsonWriter(io.StringIO()))
+            with self.assertRaises(ConnectionError):
+                sut.run()
+
+        for t in sut.threads:
+            t.join(5)
+            self.assertFalse(t.is_alive())
+
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_export_parquet(self):
+        path = join(self.tmp_dir.name, "out.parquet")
+        with patch("ubiclient.checkout.create_client", return_value = self.client):
+            self.client.window = 10
+            writer = ParquetWriter(path)
+            try:
+                Exporter(self.create_checkpoint("parquet"), writer).run()
+            finally:
+                writer.close()
+
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(3, parquet_file.num_row_groups)
+        rows = parquet_file.read().to_pylist()
+        self.assertEqual(26, len(rows))
+        self.assertEqual(285637643, rows[0]["id"])
+        self.assertEqual(datetime(2022, 6, 25, 11, 41, 52), rows[0]["updated_at"])
+        self.assertIsNone(rows[0]["cashier_id"])
+        self.assertEqual("down", json.loads(rows[0]["calculation_option"])["tax_rounding_mode"])
+
+
+class TestExportMain(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = join(self.tmp_dir.name, "export.ckpt")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_parse_datetime(self):
+        self.assertEqual(datetime(2022, 5, 31, 15), parse_datetime("2022-06-01T00:00:00+09:00"))
+        self.assertEqual(datetime(2022, 6, 1), parse_datetime("2022-06-01"))
+
+    def test_parquet_checkpoint_rejected(self):
+        with patch("sys.stderr", io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(["--since", "2022-06-01", "-f", "parquet", "-o", "out.parquet", "--checkpoint", self.checkpoint_path])
+
+    def test_http_error(self):
+        client = UbiClientForTest(dict())
+        client.search = MagicMock(side_effect=requests.HTTPError("503 Server Error"))
+        stderr = io.StringIO()
+        with patch("ubiclient.checkout.create_client", return_value = client), patch("sys.stderr", stderr):
+            code = main(["--since", "2022-06-01", "--until", "2022-07-01", "-w", "1",
+                         "-o", join(self.tmp_dir.name, "out.ndjson"), "--checkpoint", self.checkpoint_path])
+
+        self.assertEqual(1, code)
+        self.assertIn("503 Server Error", stderr.getvalue())
+        self.assertIn("rerun with --checkpoint", stderr.getvalue())
+
+    def test_resume_range_notice(self):
+        Checkpoint.create("ndjson", datetime(2022, 6, 1), datetime(2022, 7, 1), 2).save(self.checkpoint_path)
+        client = UbiClientForTest({"timestamp": "2022-06-25T14:50:16Z", "next_batch_since": "2022-06-25T14:50:16Z",
+                                   "last_updated_at": "2022-06-25T14:50:15Z", "checkouts": []})
+        stderr = io.StringIO()
+        with patch("ubiclient.checkout.create_client", return_value = client), patch("sys.stderr", stderr):
+            code = main(["--since", "2022-05-01", "-w", "2",
+                         "-o", join(self.tmp_dir.name, "out.ndjson"), "--checkpoint", self.checkpoint_path])
+
+        self.assertEqual(0, code)
+        self.assertIn("using the checkpoint's range 2022-06-01T00:00:00 - 2022-07-01T00:00:00 with 2 workers", stderr.getvalue())
+
+    def test_resume_after_interrupted_page(self):
+        resp_checkouts = load_resp_checkouts()
+        output = join(self.tmp_dir.name, "out.ndjson")
+        args = ["--since", "2022-06-01", "--until", "2022-07-01", "-w", "1", "-o", output, "--checkpoint", self.checkpoint_path]
+
+        def create_client():
+            client = NextUrlClient(resp_checkouts)
+            client.window = 10
+            return client
+
+        InterruptingWriter.pages = 0
+        with patch("ubiclient.checkout.create_client", side_effect=create_client), \
+                patch("ubiclient.__main__.NdjsonWriter", InterruptingWriter), patch("sys.stderr", io.StringIO()):
+            self.assertEqual(130, main(args))
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(15, len(f.readlines()))
+
+        with patch("ubiclient.checkout.create_client", side_effect=create_client), patch("sys.stderr", io.StringIO()):
+            self.assertEqual(0, main(args))
+
+        with open(output, encoding="utf-8") as f:
+            ids = [json.loads(line)["id"] for line in f]
+        self.assertEqual(26, len(ids))
+        self.assertEqual(26, len(set(ids)))
@@ -0,0 +1,200 @@
+import threading
+import time
+import unittest
+import requests
+from unittest.mock import MagicMock, patch
+from ubiclient.ubi_agent import SingleFlight, UbiAgent, UbiAgentException, SearchCriteria
+
+RESP_ACCOUNT = {"timestamp": "2022-06-20T08:32:52Z", "account": None, "checkout": None}
+RESP_CHECKOUTS = {"timestamp": "2022-06-25T14:50:16Z", "next_batch_since": "2022-06-25T14:50:16Z",
+                  "last_updated_at": "2022-06-25T14:50:15Z", "next-url": None, "checkouts": []}
+
+TIMEOUT = 5
+
+
+class ThreadTestCase(unittest.TestCase):
+    """
+    Waits with a deadline so that broken coalescing fails the test instead of hanging it
+    """
+    def wait_event(self, event: threading.Event):
+        self.assertTrue(event.wait(TIMEOUT), "timed out waiting for the leader")
+
+    def wait_until(self, condition):
+        deadline = time.monotonic() + TIMEOUT
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out waiting for followers")
+            time.sleep(0.001)
+
+    def join(self, threads):
+        for t in threads:
+            t.join(TIMEOUT)
+            self.assertFalse(t.is_alive(), "thread did not finish")
+
+
+class TestSingleFlight(ThreadTestCase):
+    def test_coalesce(self):
+        sut = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fn():
+            calls.append(1)
+            entered.set()
+            release.wait(TIMEOUT)
+            return "result"
+
+        leader = threading.Thread(target=lambda: results.append(sut.do("key", fn)))
+        leader.start()
+        self.wait_event(entered)
+
+        followers = [threading.Thread(target=lambda: results.append(sut.do("key", fn))) for _ in range(5)]
+        for t in followers:
+            t.start()
+        self.wait_until(lambda: sut.stats()["coalesced"] == 5)
+        release.set()
+        self.join([leader] + followers)
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(["result"] * 6, results)
+        self.assertEqual({"calls": 6, "coalesced": 5, "in_flight": 0}, sut.stats())
+
+        # a finished call is not cached
+        self.assertEqual("result", sut.do("key", fn))
+        self.assertEqual(2, len(calls))
+
+    def test_error_shared(self):
+        sut = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def fn():
+            entered.set()
+            release.wait(TIMEOUT)
+            raise ConnectionError("connection reset")
+
+        def call():
+            try:
+                sut.do("key", fn)
+            except ConnectionError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        self.wait_event(entered)
+        follower = threading.Thread(target=call)
+        follower.start()
+        self.wait_until(lambda: sut.stats()["coalesced"] == 1)
+        release.set()
+        self.join([leader, follower])
+
+        self.assertEqual(2, len(errors))
+        self.assertEqual({"calls": 2, "coalesced": 1, "in_flight": 0}, sut.stats())
+        # each caller gets its own exception, the follower's chained to the leader's
+        follower_error = next(e for e in errors if e.__cause__ is not None)
+        leader_error = next(e for e in errors if e is not follower_error)
+        self.assertIsNot(leader_error, follower_error)
+        self.assertIs(leader_error, follower_error.__cause__)
+        self.assertEqual(leader_error.args, follower_error.args)
+
+    def test_http_error_copied(self):
+        sut = SingleFlight()
+        response = requests.Response()
+        response.status_code = 503
+        error = requests.HTTPError("503 Server Error", response=response)
+
+        copied = sut._copy_error(error)
+
+        self.assertIsNot(error, copied)
+        self.assertIsInstance(copied, requests.HTTPError)
+        self.assertIs(response, copied.response)
+        self.assertEqual(error.args, copied.args)
+
+    def test_interrupt_not_shared(self):
+        sut = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def fn():
+            entered.set()
+            release.wait(TIMEOUT)
+            raise KeyboardInterrupt()
+
+        def call():
+            try:
+                sut.do("key", fn)
+            except BaseException as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        self.wait_event(entered)
+        follower = threading.Thread(target=call)
+        follower.start()
+        self.wait_until(lambda: sut.stats()["coalesced"] == 1)
+        release.set()
+        self.join([leader, follower])
+
+        self.assertEqual(2, len(errors))
+        self.assertEqual(1, len([e for e in errors if isinstance(e, KeyboardInterrupt)]))
+        self.assertEqual(1, len([e for e in errors if isinstance(e, UbiAgentException)]))
+
+
+class TestUbiAgentCoalescing(ThreadTestCase):
+    def setUp(self) -> None:
+        with patch.dict("os.environ", {"X-Ubiregi-Auth-Token": "token"}):
+            self.sut = UbiAgent()
+
+    def mock_http_get(self, json_obj):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def http_get(resource_uri, headers=None, query_strings=None):
+            entered.set()
+            release.wait(TIMEOUT)
+            response = MagicMock()
+            response.json.return_value = json_obj
+            return response
+
+        return MagicMock(side_effect=http_get), entered, release
+
+    def test_get_coalesced(self):
+        http_get, entered, release = self.mock_http_get(RESP_ACCOUNT)
+        results = []
+        with patch.object(self.sut, "http_get", http_get):
+            threads = [threading.Thread(target=lambda: results.append(self.sut.get("accounts/current"))) for _ in range(4)]
+            threads[0].start()
+            self.wait_event(entered)
+            for t in threads[1:]:
+                t.start()
+            self.wait_until(lambda: self.sut.coalescing_stats()["coalesced"] == 3)
+            release.set()
+            self.join(threads)
+
+        self.assertEqual(1, http_get.call_count)
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_search_keys(self):
+        http_get, entered, release = self.mock_http_get(RESP_CHECKOUTS)
+        release.set()
+        with patch.object(self.sut, "http_get", http_get):
+            self.sut.search("accounts/current/checkouts", SearchCriteria(limit=1))
+            self.sut.search("accounts/current/checkouts", SearchCriteria(limit=2))
+
+        # sequential calls are never coalesced
+        self.assertEqual(2, http_get.call_count)
+        self.assertEqual(0, self.sut.coalescing_stats()["coalesced"])
+
+    def test_coalesce_disabled(self):
+        with patch.dict("os.environ", {"X-Ubiregi-Auth-Token": "token"}):
+            sut = UbiAgent(coalesce=False)
+        http_get, entered, release = self.mock_http_get(RESP_ACCOUNT)
+        release.set()
+        with patch.object(sut, "http_get", http_get):
+            sut.get("accounts/current")
+
+        self.assertEqual(0, sut.coalescing_stats()["calls"])